@@ -7,23 +7,50 @@ import json
 import sys
 import os
 from pathlib import Path
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
+from PIL import Image, ImageDraw, ImageFont, ImageFilter, ImageOps
 import requests
+from requests.adapters import HTTPAdapter
 import io
 import hashlib
 import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+
+# JSON 读写（可选使用 orjson）
+try:
+    from .json_io import load_json, dump_json
+except ImportError:
+    # 作为脚本直接运行时
+    from json_io import load_json, dump_json
+
+
+# 脚本所在目录，数据/缓存/输出目录均位于其上级目录
+_SCRIPT_DIR = Path(__file__).resolve().parent
+
+# 共享的 HTTP 会话，复用 TCP/TLS 连接
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# 进程内头像缓存: (玩家名, 尺寸) -> PNG 字节，超出上限时按先进先出淘汰
+_AVATAR_MEM = {}
+_AVATAR_MEM_MAX = 256
+
+# PNG 保存参数: fast 用于即时查询，small 用于归档
+PNG_SAVE_OPTIONS = {
+    "fast": {"compress_level": 1, "optimize": False},
+    "small": {"compress_level": 9, "optimize": True},
+}
+
+# 保护 uuid_cache.json 的读改写
+_UUID_CACHE_LOCK = threading.Lock()
 
 
 def load_player_data():
     """加载玩家数据"""
     try:
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        data_file = os.path.join(script_dir, "..", "data", "player_scores_grouped.json")
-        data_path = os.path.normpath(data_file)
-        
-        with open(data_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        data_path = _SCRIPT_DIR.parent / "data" / "player_scores_grouped.json"
+        return load_json(data_path)
     except FileNotFoundError:
         print("错误: 未找到 player_scores_grouped.json 文件")
         print(f"尝试的路径: {data_path}")
@@ -42,6 +69,32 @@ def get_player_stat(player_data, player_name, stat_key):
     return 0
 
 
+def fetch_background(api):
+    """从单个 API 获取背景图片，未获取到图片时返回 None"""
+    print(f"正在从 {api['name']} 获取背景图片...")
+    response = _SESSION.get(api["url"], params=api["params"], timeout=10)
+    response.raise_for_status()
+
+    if api.get("extract_url"):
+        # 需要从 JSON 中提取图片 URL
+        data = response.json()
+        if not data.get("data"):
+            return None
+        image_url = data["data"][0]["urls"]["regular"]
+        print(f"获取到背景图片 URL: {image_url}")
+        img_response = _SESSION.get(image_url, timeout=10)
+        img_response.raise_for_status()
+        content = img_response.content
+    else:
+        # 直接获取图片数据
+        content = response.content
+
+    image = Image.open(io.BytesIO(content))
+    # 在工作线程中完成解码，避免返回无法解码的图片
+    image.load()
+    return image
+
+
 def get_random_background():
     """从多个 API 获取随机背景图片"""
     apis = [
@@ -63,32 +116,23 @@ def get_random_background():
         },
     ]
 
-    for api in apis:
-        try:
-            print(f"正在从 {api['name']} 获取背景图片...")
-            response = requests.get(api["url"], params=api["params"], timeout=10)
-            response.raise_for_status()
-
-            if api.get("extract_url"):
-                # 需要从 JSON 中提取图片 URL
-                data = response.json()
-                if data.get("data"):
-                    image_url = data["data"][0]["urls"]["regular"]
-                    print(f"获取到背景图片 URL: {image_url}")
-                    img_response = requests.get(image_url, timeout=10)
-                    img_response.raise_for_status()
-                    image = Image.open(io.BytesIO(img_response.content))
-                else:
-                    continue
-            else:
-                # 直接获取图片数据
-                image = Image.open(io.BytesIO(response.content))
-
-            print(f"从 {api['name']} 获取背景图片成功")
-            return image
-        except Exception as e:
-            print(f"警告: 从 {api['name']} 获取背景图片失败 - {e}")
-            continue
+    # 并发请求所有 API，采用最先成功返回的图片
+    executor = ThreadPoolExecutor(max_workers=len(apis))
+    futures = {executor.submit(fetch_background, api): api for api in apis}
+    try:
+        for future in as_completed(futures):
+            api = futures[future]
+            try:
+                image = future.result()
+            except Exception as e:
+                print(f"警告: 从 {api['name']} 获取背景图片失败 - {e}")
+                continue
+
+            if image is not None:
+                print(f"从 {api['name']} 获取背景图片成功")
+                return image
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     print("所有背景图片 API 均失败，使用默认渐变背景")
     return create_default_background()
@@ -97,23 +141,27 @@ def get_random_background():
 def create_default_background():
     """创建默认的渐变背景"""
     width, height = 1200, 900
-    image = Image.new("RGB", (width, height), (0, 0, 0))
-    draw = ImageDraw.Draw(image)
 
-    # 创建渐变效果
+    # 先生成 1 像素宽的渐变列
+    column = bytearray()
     for y in range(height):
-        r = int(60 + (20 * y / height))
-        g = int(40 + (30 * y / height))
-        b = int(80 + (40 * y / height))
-        draw.line([(0, y), (width, y)], fill=(r, g, b))
+        column += bytes(
+            (
+                int(60 + (20 * y / height)),
+                int(40 + (30 * y / height)),
+                int(80 + (40 * y / height)),
+            )
+        )
+    gradient = Image.frombytes("RGB", (1, height), bytes(column))
 
-    return image
+    # 横向拉伸到目标宽度，整幅图一次完成
+    return gradient.resize((width, height), Image.Resampling.NEAREST)
 
 
 def resize_and_blur_background(background, width, height, blur_radius=10):
     """调整背景大小并添加模糊效果"""
-    # 调整尺寸
-    bg = background
+    # 先等比缩放并居中裁剪到目标尺寸再模糊，模糊开销与像素数成正比
+    bg = ImageOps.fit(background.convert("RGB"), (width, height), Image.Resampling.BILINEAR)
 
     # 模糊处理
     bg = bg.filter(ImageFilter.GaussianBlur(blur_radius))
@@ -125,18 +173,20 @@ def draw_text_with_stroke(
     draw, position, text, font, text_color, stroke_color, stroke_width=3
 ):
     """绘制带描边的文字"""
-    x, y = position
-    for offset in range(-stroke_width, stroke_width + 1):
-        for offset_y in range(-stroke_width, stroke_width + 1):
-            if offset == 0 and offset_y == 0:
-                continue
-            draw.text((x + offset, y + offset_y), text, font=font, fill=stroke_color)
-
-    draw.text(position, text, font=font, fill=text_color)
+    # 使用 Pillow 原生描边，字形只需光栅化一次
+    draw.text(
+        position,
+        text,
+        font=font,
+        fill=text_color,
+        stroke_width=stroke_width,
+        stroke_fill=stroke_color,
+    )
 
 
+@lru_cache(maxsize=16)
 def load_font(size):
-    """加载字体"""
+    """加载字体（按字号缓存，同一字号只从磁盘加载一次）"""
     try:
         # 尝试加载系统字体
         font_paths = [
@@ -158,22 +208,62 @@ def load_font(size):
         return ImageFont.load_default()
 
 
+def load_uuid_cache(cache_dir):
+    """加载玩家名到 UUID 的缓存"""
+    try:
+        return load_json(cache_dir / "uuid_cache.json")
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"警告: UUID 缓存加载失败 - {e}")
+        return {}
+
+
+def save_uuid_cache(cache_dir, uuid_cache):
+    """保存玩家名到 UUID 的缓存（先写临时文件再替换）"""
+    cache_file = cache_dir / "uuid_cache.json"
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    # 批量生成时多个线程可能同时写入，合并磁盘上的内容以免丢失条目
+    with _UUID_CACHE_LOCK:
+        merged = load_uuid_cache(cache_dir)
+        merged.update(uuid_cache)
+        try:
+            dump_json(merged, tmp_file)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            print(f"警告: UUID 缓存保存失败 - {e}")
+
+
+def remember_avatar(player_name, size, avatar_bytes):
+    """将头像 PNG 字节存入进程内缓存"""
+    if len(_AVATAR_MEM) >= _AVATAR_MEM_MAX:
+        # dict 保持插入顺序，淘汰最早放入的条目（批量生成时可能被多个线程同时淘汰）
+        _AVATAR_MEM.pop(next(iter(_AVATAR_MEM), None), None)
+    _AVATAR_MEM[(player_name, size)] = avatar_bytes
+
+
 def get_minecraft_avatar(player_name, size=180):
     """从 Minecraft 头像 API 获取玩家头像，支持缓存"""
+    # 检查进程内缓存
+    cached = _AVATAR_MEM.get((player_name, size))
+    if cached is not None:
+        return Image.open(io.BytesIO(cached)).convert("RGBA")
+
     # 基于脚本位置创建缓存目录
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    cache_dir = Path(os.path.join(script_dir, "..", "avatar_cache"))
+    cache_dir = _SCRIPT_DIR.parent / "avatar_cache"
     cache_dir.mkdir(exist_ok=True)
 
     # 生成缓存文件名
-    cache_key = hashlib.md5(player_name.encode()).hexdigest()
+    cache_key = hashlib.blake2b(player_name.encode("utf-8"), digest_size=8).hexdigest()
     cache_file = cache_dir / f"{cache_key}_{size}.png"
 
     # 检查缓存是否存在
     if cache_file.exists():
         try:
             print(f"从缓存加载 {player_name} 的头像...")
-            avatar = Image.open(cache_file).convert("RGBA")
+            avatar_bytes = cache_file.read_bytes()
+            avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
+            remember_avatar(player_name, size, avatar_bytes)
             print("头像缓存加载成功")
             return avatar
         except Exception as e:
@@ -182,26 +272,38 @@ def get_minecraft_avatar(player_name, size=180):
     try:
         print(f"正在获取 {player_name} 的 Minecraft 头像...")
 
-        # 首先获取玩家的 UUID
-        uuid_url = f"https://api.mojang.com/users/profiles/minecraft/{player_name}"
-        uuid_response = requests.get(uuid_url, timeout=10)
-        uuid_response.raise_for_status()
-        uuid_data = uuid_response.json()
-        uuid = uuid_data.get("id")
+        # 首先获取玩家的 UUID（优先使用本地缓存）
+        uuid_cache = load_uuid_cache(cache_dir)
+        uuid = uuid_cache.get(player_name)
 
         if not uuid:
-            raise Exception("无法获取玩家 UUID")
+            uuid_url = f"https://api.mojang.com/users/profiles/minecraft/{player_name}"
+            uuid_response = _SESSION.get(uuid_url, timeout=10)
+            uuid_response.raise_for_status()
+            uuid_data = uuid_response.json()
+            uuid = uuid_data.get("id")
+
+            if not uuid:
+                raise Exception("无法获取玩家 UUID")
+
+            uuid_cache[player_name] = uuid
+            save_uuid_cache(cache_dir, uuid_cache)
 
         # 使用 Mineatar API 获取 Minecraft 头像
         url = f"https://api.mineatar.io/face/{uuid}"
         params = {"scale": 8, "overlay": "true", "download": "false", "format": "png"}
-        response = requests.get(url, params=params, timeout=10)
+        response = _SESSION.get(url, params=params, timeout=10)
         response.raise_for_status()
 
         avatar = Image.open(io.BytesIO(response.content)).convert("RGBA")
 
+        # 缩放到目标尺寸后再缓存，之后读取缓存时无需再缩放
+        if avatar.size != (size, size):
+            avatar = avatar.resize((size, size), Image.Resampling.LANCZOS)
+
         # 保存到缓存
         avatar.save(cache_file)
+        remember_avatar(player_name, size, cache_file.read_bytes())
         print("头像获取成功并已缓存")
         return avatar
     except Exception as e:
@@ -229,18 +331,69 @@ def create_default_avatar(size):
     return avatar
 
 
-def generate_stats_image(player_name, player_data):
-    """生成玩家战绩图"""
+def load_stats_fonts():
+    """加载战绩图使用的全部字体"""
+    return {
+        "title": load_font(60),
+        "info": load_font(40),
+        "stat": load_font(36),
+        "time": load_font(24),
+        "watermark": load_font(24),
+    }
+
+
+def create_stats_background(width=1200, height=900):
+    """获取随机背景并处理为战绩图画布"""
+    background = get_random_background()
+    return resize_and_blur_background(background, width, height)
+
+
+def generate_stats_image(player_name, player_data, quality="fast"):
+    """生成玩家战绩图
+
+    quality 为 "fast" 时使用低压缩级别快速保存，为 "small" 时追求更小的文件
+    """
+    bg = create_stats_background()
+    return _render_one(player_name, player_data, bg, load_stats_fonts(), quality)
+
+
+def generate_stats_images(player_names, player_data, quality="fast"):
+    """批量生成多名玩家的战绩图
+
+    所有玩家共享同一张背景和同一组字体，按 player_names 顺序返回图片列表
+    """
+    if not player_names:
+        return []
+
+    bg = create_stats_background()
+    fonts = load_stats_fonts()
+
+    # 每个线程使用独立的背景副本作为画布
+    with ThreadPoolExecutor(max_workers=min(8, len(player_names))) as executor:
+        futures = [
+            executor.submit(_render_one, name, player_data, bg.copy(), fonts, quality)
+            for name in player_names
+        ]
+        return [future.result() for future in futures]
+
+
+def _render_one(player_name, player_data, bg, fonts, quality="fast"):
+    """在已处理好的背景上绘制单个玩家的战绩图"""
     print(f"\n正在生成 {player_name} 的战绩图...")
 
-    # 获取玩家数据
-    play_time_hour = get_player_stat(player_data, player_name, "PlayTime.Hour")
-    play_time_min = get_player_stat(player_data, player_name, "PlayTime.Min")
-    play_time_sec = get_player_stat(player_data, player_name, "PlayTime.Sec")
-    completed_count = get_player_stat(player_data, player_name, "CompletedCount")
-    win_count = get_player_stat(player_data, player_name, "WinCount")
-    killed_count = get_player_stat(player_data, player_name, "KilledCount")
-    death_count = get_player_stat(player_data, player_name, "DeathCount")
+    # 获取玩家数据（先按计分项建立索引，避免逐项线性查找）
+    stats_map = {
+        entry["Objective"]: entry["Score"]
+        for entry in player_data.get(player_name, [])
+        if "Score" in entry
+    }
+    play_time_hour = stats_map.get("PlayTime.Hour", 0)
+    play_time_min = stats_map.get("PlayTime.Min", 0)
+    play_time_sec = stats_map.get("PlayTime.Sec", 0)
+    completed_count = stats_map.get("CompletedCount", 0)
+    win_count = stats_map.get("WinCount", 0)
+    killed_count = stats_map.get("KilledCount", 0)
+    death_count = stats_map.get("DeathCount", 0)
 
     print(f"游玩时长: {play_time_hour}时{play_time_min}分{play_time_sec}秒")
     print(f"游玩局数: {completed_count}")
@@ -248,25 +401,22 @@ def generate_stats_image(player_name, player_data):
     print(f"击杀次数: {killed_count}")
     print(f"死亡次数: {death_count}")
 
-    # 创建图片
-    width, height = 1200, 900
-    img = Image.new("RGB", (width, height), (0, 0, 0))
-
-    # 获取背景
-    background = get_random_background()
-    bg = resize_and_blur_background(background, width, height)
-    img.paste(bg, (0, 0))
+    # 背景已缩放到画布尺寸，直接作为画布
+    img = bg
+    width, height = img.size
 
     draw = ImageDraw.Draw(img)
 
-    # 加载字体
-    title_font = load_font(60)
-    info_font = load_font(40)
-    stat_font = load_font(36)
+    # 字体
+    title_font = fonts["title"]
+    info_font = fonts["info"]
+    stat_font = fonts["stat"]
 
-    # 添加半透明遮罩
-    mask = Image.new("RGBA", (width - 200, height - 200), (0, 0, 0, 150))
-    img.paste(mask, (100, 100), mask)
+    # 添加半透明遮罩（RGBA 模式的 Draw 会直接在 RGB 图上混合）
+    overlay_draw = ImageDraw.Draw(img, "RGBA")
+    overlay_draw.rectangle(
+        [(100, 100), (width - 101, height - 101)], fill=(0, 0, 0, 150)
+    )
 
     # 绘制标题
     title_text = f"{player_name} 的战绩"
@@ -286,20 +436,17 @@ def generate_stats_image(player_name, player_data):
     # 获取 Minecraft 头像
     avatar = get_minecraft_avatar(player_name, avatar_size)
 
-    # 调整头像大小
-    avatar = avatar.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS)
+    # 调整头像大小（缓存的头像已是目标尺寸时跳过）
+    if avatar.size != (avatar_size, avatar_size):
+        avatar = avatar.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS)
 
-    # 创建圆形头像
+    # 创建圆形遮罩
     mask = Image.new("L", (avatar_size, avatar_size), 0)
     mask_draw = ImageDraw.Draw(mask)
     mask_draw.ellipse([(0, 0), (avatar_size, avatar_size)], fill=255)
 
-    # 创建圆形头像
-    circular_avatar = Image.new("RGBA", (avatar_size, avatar_size), (0, 0, 0, 0))
-    circular_avatar.paste(avatar, (0, 0), mask)
-
-    # 粘贴头像
-    img.paste(circular_avatar, (avatar_x, avatar_y), circular_avatar)
+    # 以圆形遮罩直接粘贴头像
+    img.paste(avatar, (avatar_x, avatar_y), mask)
 
     # 绘制头像边框
     draw.ellipse(
@@ -384,7 +531,7 @@ def generate_stats_image(player_name, player_data):
     # 添加生成时间文本在水印上方
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     time_text = f"生成时间: {current_time}"
-    time_font = load_font(24)
+    time_font = fonts["time"]
     time_bbox = draw.textbbox((0, 0), time_text, font=time_font)
     time_width = time_bbox[2] - time_bbox[0]
     time_height = time_bbox[3] - time_bbox[1]
@@ -403,7 +550,7 @@ def generate_stats_image(player_name, player_data):
 
     # 添加水印文本 "幸运之柱©一条鱼丸_" 在图片底部居中
     watermark_text = "幸运之柱©一条鱼丸_"
-    watermark_font = load_font(24)
+    watermark_font = fonts["watermark"]
     bbox = draw.textbbox((0, 0), watermark_text, font=watermark_font)
     watermark_width = bbox[2] - bbox[0]
     watermark_height = bbox[3] - bbox[1]
@@ -421,11 +568,10 @@ def generate_stats_image(player_name, player_data):
     )
 
     # 保存图片
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_dir = os.path.join(script_dir, "..", "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{player_name}_stats.png")
-    img.save(output_file)
+    output_dir = _SCRIPT_DIR.parent / "output"
+    output_dir.mkdir(exist_ok=True)
+    output_file = output_dir / f"{player_name}_stats.png"
+    img.save(output_file, format="PNG", **PNG_SAVE_OPTIONS[quality])
     print(f"战绩图已保存为: {output_file}")
 
     return img
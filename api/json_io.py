@@ -0,0 +1,38 @@
+"""
+JSON 文件读写
+优先使用 orjson 加速，不可用时回退到标准库 json
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Optional
+
+# 可选依赖 orjson，解析失败时抛出的 orjson.JSONDecodeError 是 json.JSONDecodeError 的子类
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path: Path) -> Any:
+    """读取 JSON 文件"""
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def dump_json(data: Any, path: Path, indent: Optional[int] = None) -> None:
+    """写入 JSON 文件（indent 为 None 时使用紧凑格式）"""
+    if orjson is not None:
+        # orjson 只支持 2 空格缩进，输出即为 UTF-8
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=option))
+    else:
+        separators = (",", ":") if indent is None else None
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent, separators=separators, ensure_ascii=False)
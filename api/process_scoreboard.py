@@ -9,7 +9,14 @@ import sys
 import argparse
 from pathlib import Path
 from collections import defaultdict
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+# JSON 读写（可选使用 orjson）
+try:
+    from .json_io import load_json, dump_json
+except ImportError:
+    # 作为脚本直接运行时
+    from json_io import load_json, dump_json
 
 
 def nbt_to_json(nbt_data):
@@ -38,38 +45,60 @@ def nbt_to_json(nbt_data):
         return str(nbt_data)
 
 
-def parse_scoreboard_dat(file_path: Path) -> Any:
-    """解析 scoreboard.dat 文件并返回 JSON 可序列化的数据"""
+def load_scoreboard_nbt(file_path: Path) -> Any:
+    """加载 scoreboard.dat 文件并返回原始 NBT 对象"""
     print(f"正在解析文件: {file_path}")
     
     if not file_path.exists():
         raise FileNotFoundError(f"文件 {file_path} 不存在")
     
     # 使用 nbtlib 加载文件（自动检测 gzip 压缩）
-    nbt_file = nbtlib.load(file_path)
-    
     # 在 nbtlib 2.x 中，File 对象本身就是字典，可以直接访问
+    return nbtlib.load(file_path)
+
+
+def parse_scoreboard_dat(file_path: Path) -> Any:
+    """解析 scoreboard.dat 文件并返回 JSON 可序列化的数据"""
+    nbt_file = load_scoreboard_nbt(file_path)
+    
     # 转换为 Python 字典
     data = nbt_to_json(nbt_file)
     
     return data
 
 
-def export_to_json(data: Any, output_file: Path, indent: int = 2) -> None:
-    """导出数据到 JSON 文件"""
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+def iter_player_scores(nbt_file: Any) -> Iterator[Tuple[str, str, Optional[int]]]:
+    """
+    直接遍历 NBT 中的 PlayerScores，只转换需要的字段
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=indent, ensure_ascii=False)
+    参数:
+        nbt_file: nbtlib 加载的原始 scoreboard 数据
+        
+    返回:
+        迭代器，每项为 (玩家名, 计分项, 分数)，分数缺失时为 None
+    """
+    player_scores = nbt_file.get("data", {}).get("PlayerScores", [])
+    
+    for entry in player_scores:
+        score = entry.get("Score")
+        yield (
+            str(entry.get("Name", "未知玩家")),
+            str(entry.get("Objective", "")),
+            None if score is None else int(score),
+        )
+
+
+def export_to_json(data: Any, output_file: Path, indent: Optional[int] = None) -> None:
+    """导出数据到 JSON 文件（indent 为 None 时使用紧凑格式）"""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    dump_json(data, output_file, indent=indent)
     print(f"数据已导出到: {output_file}")
 
 
 def load_scoreboard_data(json_file: Path) -> Dict[str, Any]:
     """加载 scoreboard.json 文件"""
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
+        return load_json(json_file)
     except FileNotFoundError:
         print(f"错误: 文件 {json_file} 不存在")
         sys.exit(1)
@@ -78,9 +107,13 @@ def load_scoreboard_data(json_file: Path) -> Dict[str, Any]:
         sys.exit(1)
 
 
+# 分组数据中保留的计分项字段
+_KEEP_FIELDS = ("Objective", "Score")
+
+
 def clean_score_entry(score_entry: Dict[str, Any]) -> Dict[str, Any]:
     """
-    清理计分项数据，移除 Locked 和 Name 字段
+    清理计分项数据，只保留 Objective 和 Score 字段
     
     参数:
         score_entry: 原始计分项字典
@@ -88,16 +121,8 @@ def clean_score_entry(score_entry: Dict[str, Any]) -> Dict[str, Any]:
     返回:
         dict: 清理后的计分项字典
     """
-    # 创建副本以避免修改原始数据
-    cleaned = score_entry.copy()
-    
-    # 移除 Locked 字段
-    cleaned.pop("Locked", None)
-    
-    # 移除 Name 字段
-    cleaned.pop("Name", None)
-    
-    return cleaned
+    # 直接构建新字典，不复制再删除多余字段
+    return {key: score_entry[key] for key in _KEEP_FIELDS if key in score_entry}
 
 
 def group_scores_by_player(scoreboard_data: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
@@ -105,7 +130,8 @@ def group_scores_by_player(scoreboard_data: Dict[str, Any]) -> Dict[str, List[Di
     按玩家名分组 PlayerScores 数据
     
     参数:
-        scoreboard_data: 从 scoreboard.json 加载的完整数据
+        scoreboard_data: 从 scoreboard.json 加载的完整数据，
+            或 nbtlib 加载的原始 NBT 数据
         
     返回:
         dict: 按玩家名分组的字典，结构为:
@@ -129,13 +155,22 @@ def group_scores_by_player(scoreboard_data: Dict[str, Any]) -> Dict[str, List[Di
     # 使用 defaultdict 按玩家名分组
     grouped = defaultdict(list)
     
+    # 原始 NBT 数据：只提取需要的字段，无需整体转换
+    if isinstance(scoreboard_data, nbtlib.tag.Compound):
+        for player_name, objective, score in iter_player_scores(scoreboard_data):
+            entry = {"Objective": objective}
+            if score is not None:
+                entry["Score"] = score
+            grouped[player_name].append(entry)
+        return grouped
+    
     for score_entry in player_scores:
         player_name = score_entry.get("Name", "未知玩家")
-        # 清理计分项数据，移除 Locked 和 Name 字段
+        # 清理计分项数据，只保留 Objective 和 Score 字段
         cleaned_entry = clean_score_entry(score_entry)
         grouped[player_name].append(cleaned_entry)
     
-    return dict(grouped)
+    return grouped
 
 
 def process_dat_to_json(dat_file: Path, output_json: Path) -> None:
@@ -144,8 +179,8 @@ def process_dat_to_json(dat_file: Path, output_json: Path) -> None:
         # 解析文件
         scoreboard_data = parse_scoreboard_dat(dat_file)
         
-        # 输出为 JSON 文件
-        export_to_json(scoreboard_data, output_json)
+        # 输出为 JSON 文件（中间数据，使用紧凑格式）
+        export_to_json(scoreboard_data, output_json, indent=None)
         
         # 同时打印一些摘要信息
         print("\n数据摘要:")
@@ -167,7 +202,7 @@ def process_json_to_grouped(json_file: Path, output_grouped: Path) -> None:
     # 1. 加载数据
     scoreboard_data = load_scoreboard_data(json_file)
     
-    # 2. 按玩家分组（自动移除 Locked 和 Name 字段）
+    # 2. 按玩家分组（只保留 Objective 和 Score 字段）
     grouped_scores = group_scores_by_player(scoreboard_data)
     
     if not grouped_scores:
@@ -176,8 +211,43 @@ def process_json_to_grouped(json_file: Path, output_grouped: Path) -> None:
     
     print(f"成功处理 {len(grouped_scores)} 名玩家的数据")
     
-    # 3. 导出数据
-    export_to_json(grouped_scores, output_grouped)
+    # 3. 导出数据（保留缩进便于阅读）
+    export_to_json(grouped_scores, output_grouped, indent=2)
+
+
+def process_dat_to_grouped(dat_file: Path, output_grouped: Path,
+                           output_json: Optional[Path] = None) -> None:
+    """在内存中完成 dat 文件到分组数据的转换，不生成中间 JSON 文件
+
+    参数:
+        dat_file: scoreboard.dat 文件路径
+        output_grouped: 分组 JSON 输出路径
+        output_json: 若指定，同时导出原始 JSON 到该路径
+    """
+    try:
+        # 1. 加载原始 NBT 数据
+        nbt_file = load_scoreboard_nbt(dat_file)
+        
+        if output_json is not None:
+            export_to_json(nbt_to_json(nbt_file), output_json, indent=None)
+        
+        # 2. 直接从 NBT 按玩家分组（只提取 Objective 和 Score 字段）
+        grouped_scores = group_scores_by_player(nbt_file)
+    except Exception as e:
+        print(f"解析过程中发生错误: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+    
+    if not grouped_scores:
+        print("错误: 未找到任何玩家分数数据")
+        sys.exit(1)
+    
+    print(f"成功处理 {len(grouped_scores)} 名玩家的数据")
+    
+    # 3. 导出数据（保留缩进便于阅读）
+    export_to_json(grouped_scores, output_grouped, indent=2)
+
 
 def main():
     """主函数"""
@@ -194,6 +264,9 @@ def main():
   
   # 指定 scoreboard.dat 文件路径并执行完整处理
   python process_scoreboard.py --full-process "E:\\群组\\1.21.11-幸运之柱\\world\\data\\scoreboard.dat"
+  
+  # 完整处理并保留原始 scoreboard.json
+  python process_scoreboard.py --full-process --write-intermediate --default-paths
         """
     )
     
@@ -211,6 +284,12 @@ def main():
         help="执行完整处理流程（从 .dat 到分组 JSON）"
     )
     
+    parser.add_argument(
+        "--write-intermediate",
+        action="store_true",
+        help="完整处理流程中同时导出原始 scoreboard.json"
+    )
+    
     parser.add_argument(
         "--default-paths", "-d",
         action="store_true",
@@ -273,19 +352,15 @@ def main():
     
     # 执行处理流程
     if args.full_process:
-        # 完整处理流程：dat -> json -> grouped
+        # 完整处理流程：dat -> grouped（仅在需要时导出原始 JSON）
         print("\n开始完整处理流程...")
         
-        # 步骤1: 将 dat 文件转换为 JSON
-        print("\n=== 步骤1: 解析 scoreboard.dat 文件 ===")
-        process_dat_to_json(dat_file, output_json)
-        
-        # 步骤2: 将 JSON 文件按玩家分组
-        print("\n=== 步骤2: 按玩家分组数据 ===")
-        process_json_to_grouped(output_json, output_grouped)
+        intermediate_json = output_json if args.write_intermediate else None
+        process_dat_to_grouped(dat_file, output_grouped, intermediate_json)
         
         print(f"\n完整处理流程完成！")
-        print(f"  - 原始 JSON 文件: {output_json}")
+        if intermediate_json is not None:
+            print(f"  - 原始 JSON 文件: {output_json}")
         print(f"  - 分组 JSON 文件: {output_grouped}")
         
     else:
@@ -3,10 +3,60 @@
 处理玩家数据并生成排行榜
 """
 
-import json
+import heapq
 import datetime
+from itertools import repeat
+from operator import truediv
 from pathlib import Path
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, List, Any, Tuple, Optional, Union, Iterator, Iterable
+
+# JSON 读写（可选使用 orjson）
+try:
+    from .json_io import load_json, dump_json
+except ImportError:
+    # 作为脚本直接运行时
+    from json_io import load_json, dump_json
+
+# 可选依赖 ijson，用于按玩家流式解析大型 player_scores_grouped.json
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# 统计数据的列顺序
+_STAT_FIELDS = (
+    "play_time_seconds",  # 总游玩时长（秒）
+    "games_played",       # 游玩局数
+    "wins",               # 胜利局数
+    "kills",              # 击杀数
+    "deaths",             # 死亡数
+)
+
+# 计分项编码: 计分项 -> (统计列, 倍数)
+# 计分板中每名玩家的每个计分项只有一条记录，因此计数类计分项累加即等于赋值
+_OBJ_CODE = {
+    "PlayTime.Hour": (0, 3600),  # 小时转秒
+    "PlayTime.Min": (0, 60),     # 分钟转秒
+    "PlayTime.Sec": (0, 1),      # 秒
+    "CompletedCount": (1, 1),
+    "WinCount": (2, 1),
+    "KilledCount": (3, 1),
+    "DeathCount": (4, 1),
+}
+
+
+def _stats_row(player_data: List[Dict[str, Any]]) -> List[int]:
+    """计算玩家的统计数据，按 _STAT_FIELDS 顺序返回一行数值"""
+    row = [0] * len(_STAT_FIELDS)
+    
+    for entry in player_data:
+        code = _OBJ_CODE.get(entry.get("Objective"))
+        if code is not None:
+            column, multiplier = code
+            row[column] += entry.get("Score", 0) * multiplier
+    
+    return row
 
 
 def calculate_player_stats(player_data: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -18,138 +68,144 @@ def calculate_player_stats(player_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     返回:
         dict: 包含各项统计数据的字典
     """
-    stats = {
-        "play_time_seconds": 0,  # 总游玩时长（秒）
-        "games_played": 0,       # 游玩局数
-        "wins": 0,               # 胜利局数
-        "kills": 0,              # 击杀数
-        "deaths": 0,             # 死亡数
-    }
-    
-    for entry in player_data:
-        objective = entry.get("Objective", "")
-        score = entry.get("Score", 0)
-        
-        if objective == "PlayTime.Hour":
-            stats["play_time_seconds"] += score * 3600  # 小时转秒
-        elif objective == "PlayTime.Min":
-            stats["play_time_seconds"] += score * 60    # 分钟转秒
-        elif objective == "PlayTime.Sec":
-            stats["play_time_seconds"] += score         # 秒
-        elif objective == "CompletedCount":
-            stats["games_played"] = score
-        elif objective == "WinCount":
-            stats["wins"] = score
-        elif objective == "KilledCount":
-            stats["kills"] = score
-        elif objective == "DeathCount":
-            stats["deaths"] = score
+    return dict(zip(_STAT_FIELDS, _stats_row(player_data)))
+
+
+# generate_rankings 接受的玩家数据来源
+PlayerScoresSource = Union[
+    Path,
+    Dict[str, List[Dict[str, Any]]],
+    Iterable[Tuple[str, List[Dict[str, Any]]]],
+]
+
+# 特殊玩家名（计分板虚拟玩家等）的首字符
+_SPECIAL_PREFIXES = frozenset({'$', '#', '%', '['})
+
+# 排行榜保留的名次数量
+TOP_N = 10
+
+# 各项排行榜及其排序方向（True 为降序）
+_RANK_ORDER = (
+    ("play_time", True),
+    ("games_played", True),
+    ("wins", True),
+    ("kills", True),
+    ("deaths", False),  # 死亡数越少越好
+    ("kd_ratio", True),
+    ("win_rate", True),
+)
+
+
+def _format_rank_entry(key: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """为单条排行榜记录补充显示用的格式化字段
+
+    所有记录都会得到 display 字段，即消息中展示的值
+    """
+    value = item["value"]
+    if key == "play_time":
+        # 游玩时长（秒转小时:分钟:秒格式）
+        minutes, seconds = divmod(value, 60)
+        hours, minutes = divmod(minutes, 60)
+        formatted = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+        return {
+            **item,
+            "formatted": formatted,
+            "display": formatted,
+            "hours": hours,
+            "minutes": minutes,
+            "seconds": seconds
+        }
+    if key == "kd_ratio":
+        formatted = f"{value:.2f}"
+        return {**item, "formatted": formatted, "display": formatted}
+    if key == "win_rate":
+        formatted = f"{value:.1f}%"
+        return {**item, "formatted": formatted, "display": formatted}
+    return {**item, "display": str(value)}
+
+
+def _iter_player_data(player_scores: PlayerScoresSource) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """逐个玩家迭代分组数据，结果为 (玩家名, 计分项列表)
     
-    return stats
+    传入文件路径且 ijson 可用时流式解析，内存中只保留当前玩家的数据
+    """
+    if isinstance(player_scores, dict):
+        yield from player_scores.items()
+    elif not isinstance(player_scores, Path):
+        # 已是 (玩家名, 计分项列表) 序列
+        yield from player_scores
+    elif ijson is not None:
+        with open(player_scores, 'rb') as f:
+            yield from ijson.kvitems(f, '', use_float=True)
+    else:
+        yield from load_json(player_scores).items()
 
 
-def generate_rankings(player_scores_json_path: Path) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+def generate_rankings(player_scores: PlayerScoresSource,
+                      filter_special: bool = True) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
     """生成排行榜数据
     
     参数:
-        player_scores_json_path: player_scores_grouped.json 文件路径
+        player_scores: player_scores_grouped.json 文件路径，已加载的分组玩家数据，
+            或 (玩家名, 计分项列表) 序列
+        filter_special: 是否过滤特殊玩家名，传入的数据已过滤时可设为 False
         
     返回:
-        tuple: (排行榜数据, 错误信息)
+        tuple: (排行榜数据, 错误信息)，每项排行榜只包含前 TOP_N 名，
+            每条记录已包含显示用的格式化字段（display 等）
     """
     try:
         # 检查玩家数据文件是否存在
-        if not player_scores_json_path.exists():
+        if isinstance(player_scores, Path) and not player_scores.exists():
             return None, "玩家数据文件不存在，请先运行数据更新"
         
-        with open(player_scores_json_path, 'r', encoding='utf-8') as f:
-            all_player_data = json.load(f)
-        
-        # 过滤掉特殊玩家名
-        player_stats = {}
-        for player_name, player_data in all_player_data.items():
-            if (player_name and not player_name.startswith('$') and 
-                not player_name.startswith('#') and 
-                not player_name.startswith('%') and
-                not player_name.startswith('[')):
-                stats = calculate_player_stats(player_data)
-                player_stats[player_name] = stats
+        # 一次遍历完成过滤和统计：过滤掉特殊玩家名，统计结果直接写入矩阵
+        names = []
+        stats_matrix = []
+        for player_name, player_data in _iter_player_data(player_scores):
+            if not filter_special or (player_name and player_name[0] not in _SPECIAL_PREFIXES):
+                names.append(player_name)
+                stats_matrix.append(_stats_row(player_data))
         
-        if not player_stats:
+        if not names:
             return None, "未找到有效的玩家数据"
         
-        # 生成各项排行榜
-        rankings = {
-            "play_time": [],      # 游玩时长排行榜
-            "games_played": [],   # 游玩局数排行榜
-            "wins": [],           # 胜利局数排行榜
-            "kills": [],          # 击杀数排行榜
-            "deaths": [],         # 死亡数排行榜
-            "kd_ratio": [],       # KD比率排行榜（击杀/死亡）
-            "win_rate": [],       # 胜率排行榜（胜利/游玩局数）
+        # 按列存储各项数据（结构数组），排序时只比较数值
+        # 将 N 行 × 5 列的统计矩阵一次性转置为各列
+        play_time, games_played, wins, kills, deaths = zip(*stats_matrix)
+        
+        # 整列计算比率，分母用 max(x, 1) 避免除零
+        ones = repeat(1)
+        
+        # KD比率
+        kd_ratio = list(map(truediv, kills, map(max, deaths, ones)))
+        
+        # 胜率
+        win_rate = [r * 100 for r in map(truediv, wins, map(max, games_played, ones))]
+        
+        columns = {
+            "play_time": play_time,        # 游玩时长排行榜
+            "games_played": games_played,  # 游玩局数排行榜
+            "wins": wins,                  # 胜利局数排行榜
+            "kills": kills,                # 击杀数排行榜
+            "deaths": deaths,              # 死亡数排行榜
+            "kd_ratio": kd_ratio,          # KD比率排行榜（击杀/死亡）
+            "win_rate": win_rate,          # 胜率排行榜（胜利/游玩局数）
         }
         
-        # 计算各项数据并排序
-        for player_name, stats in player_stats.items():
-            # 游玩时长（秒转小时:分钟:秒格式）
-            play_time_seconds = stats["play_time_seconds"]
-            hours = play_time_seconds // 3600
-            minutes = (play_time_seconds % 3600) // 60
-            seconds = play_time_seconds % 60
-            play_time_formatted = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
-            # KD比率（避免除零）
-            deaths = stats["deaths"] if stats["deaths"] > 0 else 1
-            kd_ratio = stats["kills"] / deaths
-            
-            # 胜率（避免除零）
-            games = stats["games_played"] if stats["games_played"] > 0 else 1
-            win_rate = (stats["wins"] / games) * 100
-            
-            rankings["play_time"].append({
-                "player": player_name,
-                "value": stats["play_time_seconds"],
-                "formatted": play_time_formatted,
-                "hours": hours,
-                "minutes": minutes,
-                "seconds": seconds
-            })
-            
-            rankings["games_played"].append({
-                "player": player_name,
-                "value": stats["games_played"]
-            })
-            
-            rankings["wins"].append({
-                "player": player_name,
-                "value": stats["wins"]
-            })
-            
-            rankings["kills"].append({
-                "player": player_name,
-                "value": stats["kills"]
-            })
-            
-            rankings["deaths"].append({
-                "player": player_name,
-                "value": stats["deaths"]
-            })
-            
-            rankings["kd_ratio"].append({
-                "player": player_name,
-                "value": kd_ratio,
-                "formatted": f"{kd_ratio:.2f}"
-            })
-            
-            rankings["win_rate"].append({
-                "player": player_name,
-                "value": win_rate,
-                "formatted": f"{win_rate:.1f}%"
-            })
+        all_indices = range(len(names))
         
-        # 对各项排行榜进行排序
-        for key in rankings:
-            rankings[key].sort(key=lambda x: x["value"], reverse=True)
+        # 各项排行榜用堆只选出前 TOP_N 名，无需完整排序
+        rankings = {}
+        for key, descending in _RANK_ORDER:
+            column = columns[key]
+            select = heapq.nlargest if descending else heapq.nsmallest
+            top = select(TOP_N, all_indices, key=column.__getitem__)
+            # 只对入选的记录生成格式化字段，保存和生成消息时直接使用
+            rankings[key] = [
+                _format_rank_entry(key, {"player": names[i], "value": column[i]})
+                for i in top
+            ]
         
         return rankings, None
         
@@ -157,12 +213,14 @@ def generate_rankings(player_scores_json_path: Path) -> Tuple[Optional[Dict[str,
         return None, f"生成排行榜时出错: {str(e)}"
 
 
-def save_rankings_to_json(rankings: Dict[str, Any], output_file: Path) -> Tuple[bool, Optional[str]]:
+def save_rankings_to_json(rankings: Dict[str, Any], output_file: Path,
+                          source_mtime: Optional[float] = None) -> Tuple[bool, Optional[str]]:
     """保存排行榜数据到 JSON 文件
     
     参数:
         rankings: 排行榜数据
         output_file: 输出文件路径
+        source_mtime: 生成排行榜所用 player_scores_grouped.json 的修改时间，用于判断是否需要重新生成
         
     返回:
         tuple: (成功标志, 错误信息)
@@ -171,17 +229,12 @@ def save_rankings_to_json(rankings: Dict[str, Any], output_file: Path) -> Tuple[
         # 准备要保存的数据
         data_to_save = {
             "generated_at": datetime.datetime.now().isoformat(),
-            "rankings": {}
+            "source_mtime": source_mtime,
+            "rankings": rankings
         }
         
-        # 只保存前10名
-        for key, rank_list in rankings.items():
-            data_to_save["rankings"][key] = rank_list[:10]
-        
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, indent=2, ensure_ascii=False)
+        dump_json(data_to_save, output_file, indent=2)
         
         return True, None
         
@@ -189,6 +242,36 @@ def save_rankings_to_json(rankings: Dict[str, Any], output_file: Path) -> Tuple[
         return False, f"保存排行榜数据时出错: {str(e)}"
 
 
+def load_rankings_from_json(input_file: Path) -> Optional[Dict[str, Any]]:
+    """读取通过 save_rankings_to_json 保存的数据
+    
+    参数:
+        input_file: rankings.json 文件路径
+        
+    返回:
+        dict: 保存的完整数据（包含 source_mtime 和 rankings），读取失败时返回 None
+    """
+    try:
+        return load_json(input_file)
+    except (OSError, ValueError):
+        return None
+
+
+# 前三名的排名符号
+_RANK_SYMBOLS = ("🥇", "🥈", "🥉")
+
+# 各项排行榜消息配置
+_RANK_CATEGORIES = (
+    ("play_time", "🏆 游玩时长排行榜"),
+    ("games_played", "🎮 游玩局数排行榜"),
+    ("wins", "🏅 胜利局数排行榜"),
+    ("kills", "⚔️ 击杀数排行榜"),
+    ("deaths", "💀 死亡数排行榜"),
+    ("kd_ratio", "📊 KD比率排行榜"),
+    ("win_rate", "📈 胜率排行榜"),
+)
+
+
 def create_rank_message_nodes(rankings: Dict[str, Any], bot_uin: int = 1708197104) -> List:
     """创建群合并转发消息节点
     
@@ -203,48 +286,21 @@ def create_rank_message_nodes(rankings: Dict[str, Any], bot_uin: int = 170819710
     
     nodes = []
     
-    # 各项排行榜配置
-    rank_categories = [
-        ("play_time", "🏆 游玩时长排行榜", "value", True, lambda x: x["formatted"]),
-        ("games_played", "🎮 游玩局数排行榜", "value", True, None),
-        ("wins", "🏅 胜利局数排行榜", "value", True, None),
-        ("kills", "⚔️ 击杀数排行榜", "value", True, None),
-        ("deaths", "💀 死亡数排行榜", "value", False, None),  # 死亡数越少越好
-        ("kd_ratio", "📊 KD比率排行榜", "value", True, lambda x: x["formatted"]),
-        ("win_rate", "📈 胜率排行榜", "value", True, lambda x: x["formatted"]),
-    ]
-    
     # 为每个排行榜创建独立的 Node
-    for rank_key, title, value_key, descending, formatter in rank_categories:
+    for rank_key, title in _RANK_CATEGORIES:
         if rank_key not in rankings or not rankings[rank_key]:
             continue
             
-        rank_list = rankings[rank_key][:10]
+        rank_list = rankings[rank_key][:TOP_N]
         
-        # 为每个排行榜构建独立的文本
-        rank_text = f"{title}\n"
+        # 为每个排行榜构建独立的文本（先收集各行再一次性拼接）
+        parts = [f"{title}\n"]
         for i, item in enumerate(rank_list):
-            rank_num = i + 1
-            player = item["player"]
-            value = item[value_key]
-            
-            # 使用格式化函数（如果有）
-            if formatter:
-                display_value = formatter(item)
-            else:
-                display_value = str(value)
-            
             # 添加排名符号
-            if rank_num == 1:
-                rank_symbol = "🥇"
-            elif rank_num == 2:
-                rank_symbol = "🥈"
-            elif rank_num == 3:
-                rank_symbol = "🥉"
-            else:
-                rank_symbol = f"{rank_num}."
+            rank_symbol = _RANK_SYMBOLS[i] if i < len(_RANK_SYMBOLS) else f"{i + 1}."
             
-            rank_text += f"{rank_symbol} {player}: {display_value}\n"
+            parts.append(f"{rank_symbol} {item['player']}: {item['display']}\n")
+        rank_text = "".join(parts)
         
         # 创建独立的 Node 用于这个排行榜
         rank_node = Node(
@@ -303,9 +359,8 @@ def main():
         print("\n排行榜摘要:")
         for key in ["play_time", "games_played", "wins", "kills", "deaths", "kd_ratio", "win_rate"]:
             if rankings[key]:
-                top_player = rankings[key][0]["player"]
-                top_value = rankings[key][0].get("formatted", rankings[key][0]["value"])
-                print(f"  {key}: {top_player} ({top_value})")
+                top_item = rankings[key][0]
+                print(f"  {key}: {top_item['player']} ({top_item['display']})")
     else:
         print("错误: 未能生成排行榜数据")
     
@@ -8,7 +8,6 @@ from astrbot.api import logger
 from astrbot.api.message_components import Image, Node, Plain
 from typing import Dict, List, Any, Optional, Tuple, Union, AsyncGenerator
 from pathlib import Path
-import json
 import datetime
 import sys
 import os
@@ -16,17 +15,15 @@ import time
 
 # 导入 API 模块
 sys.path.insert(0, str(Path(__file__).parent))
+# JSON 读写（可选使用 orjson），不依赖其他 API 模块，始终可用
+from api.json_io import load_json, dump_json
 try:
-    from api.process_scoreboard import (
-        process_dat_to_json,
-        process_json_to_grouped,
-        load_scoreboard_data,
-        group_scores_by_player
-    )
-    from api.generate_player_stats_image import generate_stats_image
+    from api.process_scoreboard import process_dat_to_grouped
+    from api.generate_player_stats_image import generate_stats_image, PNG_SAVE_OPTIONS
     from api.rankings import (
         generate_rankings,
         save_rankings_to_json,
+        load_rankings_from_json,
         create_rank_message_nodes
     )
     API_AVAILABLE = True
@@ -34,6 +31,20 @@ except ImportError as e:
     logger.error(f"导入 API 模块失败: {e}")
     API_AVAILABLE = False
 
+# 特殊玩家名（计分板虚拟玩家等）的首字符
+_SPECIAL_PREFIXES = frozenset({'$', '#', '%', '['})
+
+# 数据文件更新检查的最短间隔（秒）
+UPDATE_CHECK_INTERVAL = 5.0
+
+
+def _stat_or_none(path: Path) -> Optional[os.stat_result]:
+    """获取文件状态，文件不存在时返回 None"""
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
 
 class Config:
     """配置管理类"""
@@ -75,9 +86,21 @@ class DataManager:
         self.avatar_cache_dir = plugin_dir / "avatar_cache"
         
         # 数据文件路径
-        self.scoreboard_json_path = self.data_dir / "scoreboard.json"
         self.player_scores_json_path = self.data_dir / "player_scores_grouped.json"
         self.rankings_json_path = self.data_dir / "rankings.json"
+        # 记录分组数据由哪个版本的 scoreboard.dat 生成（未纳入版本库）
+        self.grouped_source_path = self.data_dir / "player_scores_grouped.source.json"
+        
+        # 分组玩家数据缓存: (文件修改时间, 解析后的数据)
+        self._cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        # 过滤后的玩家数据缓存: (文件修改时间, (玩家名列表, 计分项列表))
+        self._valid_cache: Optional[Tuple[float, Tuple[List[str], List[List[Dict[str, Any]]]]]] = None
+        
+        # 当前分组数据对应的 scoreboard.dat 修改时间，按需从 grouped_source_path 读取
+        self._built_from: Optional[float] = None
+        
+        # 最近一次成功检查数据文件的时间（time.monotonic）
+        self._last_check_ts: Optional[float] = None
         
         # 创建必要的目录
         self._create_directories()
@@ -88,47 +111,96 @@ class DataManager:
         self.output_dir.mkdir(exist_ok=True)
         self.avatar_cache_dir.mkdir(exist_ok=True)
     
-    def update_data_files(self) -> bool:
-        """更新数据文件（如果需要）"""
+    def update_data_files(self, force: bool = False) -> bool:
+        """更新数据文件（如果需要）
+        
+        Args:
+            force: 为 True 时忽略检查间隔，总是重新比较文件修改时间
+        """
         try:
             if not API_AVAILABLE:
                 logger.error("API 模块不可用，无法更新数据文件")
                 return False
             
-            update_needed = False
+            # 短时间内重复调用时直接沿用上次的检查结果
+            now = time.monotonic()
+            if (not force and self._last_check_ts is not None and
+                    now - self._last_check_ts < UPDATE_CHECK_INTERVAL):
+                return True
             
-            # 检查 scoreboard.dat 是否比 scoreboard.json 新
-            if not self.scoreboard_json_path.exists():
-                update_needed = True
-            elif self.config.scoreboard_dat_path.exists():
-                dat_mtime = self.config.scoreboard_dat_path.stat().st_mtime
-                json_mtime = self.scoreboard_json_path.stat().st_mtime
-                if dat_mtime > json_mtime:
-                    update_needed = True
+            # 分组数据缺失，或不是由当前 scoreboard.dat 生成时需要重新生成
+            # （不比较分组文件自身的修改时间，随插件分发的示例数据也会被替换）
+            dat_st = _stat_or_none(self.config.scoreboard_dat_path)
+            update_needed = not self.player_scores_json_path.exists()
+            if dat_st is not None and self._built_from != dat_st.st_mtime:
+                self._built_from = self._load_source_mtime()
+                update_needed = update_needed or self._built_from != dat_st.st_mtime
             
             if update_needed:
                 logger.info("检测到数据文件需要更新，正在解析 scoreboard.dat...")
                 
-                # 使用 API 模块处理数据
-                process_dat_to_json(
+                # 使用 API 模块直接生成分组数据，不写中间 JSON 文件
+                process_dat_to_grouped(
                     self.config.scoreboard_dat_path,
-                    self.scoreboard_json_path
-                )
-                
-                # 处理 JSON 到分组数据
-                process_json_to_grouped(
-                    self.scoreboard_json_path,
                     self.player_scores_json_path
                 )
                 
+                if dat_st is not None:
+                    self._save_source_mtime(dat_st.st_mtime)
+                
                 logger.info("scoreboard.dat 解析和数据处理完成")
             
+            self._last_check_ts = now
             return True
             
         except Exception as e:
             logger.error(f"更新数据文件时出错: {e}")
             return False
     
+    def _load_source_mtime(self) -> Optional[float]:
+        """读取生成分组数据时 scoreboard.dat 的修改时间，记录不存在时返回 None"""
+        try:
+            return load_json(self.grouped_source_path).get("source_mtime")
+        except (OSError, ValueError, AttributeError):
+            return None
+    
+    def _save_source_mtime(self, source_mtime: float) -> None:
+        """记录生成分组数据时 scoreboard.dat 的修改时间"""
+        dump_json({"source_mtime": source_mtime}, self.grouped_source_path)
+        self._built_from = source_mtime
+    
+    def _load_grouped(self) -> Dict[str, Any]:
+        """加载分组玩家数据，文件未修改时直接返回缓存"""
+        mtime = self.player_scores_json_path.stat().st_mtime
+        if self._cache is not None and self._cache[0] == mtime:
+            return self._cache[1]
+        
+        player_data = load_json(self.player_scores_json_path)
+        
+        self._cache = (mtime, player_data)
+        return player_data
+    
+    def get_valid_players(self) -> Tuple[float, List[str], List[List[Dict[str, Any]]]]:
+        """加载过滤掉特殊玩家名后的玩家数据，文件未修改时直接返回缓存
+        
+        Returns:
+            Tuple[数据对应的文件修改时间, 玩家名列表, 对应的计分项列表]，保持文件中的顺序
+        """
+        player_data = self._load_grouped()
+        mtime = self._cache[0]
+        if self._valid_cache is not None and self._valid_cache[0] == mtime:
+            return (mtime, *self._valid_cache[1])
+        
+        names = []
+        entries = []
+        for name, scores in player_data.items():
+            if name and name[0] not in _SPECIAL_PREFIXES:
+                names.append(name)
+                entries.append(scores)
+        
+        self._valid_cache = (mtime, (names, entries))
+        return mtime, names, entries
+    
     def get_player_list(self) -> List[str]:
         """获取玩家列表"""
         try:
@@ -137,19 +209,10 @@ class DataManager:
                 if not self.update_data_files():
                     return []
             
-            with open(self.player_scores_json_path, 'r', encoding='utf-8') as f:
-                player_data = json.load(f)
+            # 已过滤掉特殊玩家名
+            _, names, _ = self.get_valid_players()
             
-            # 过滤掉特殊玩家名
-            players = []
-            for name in player_data.keys():
-                if (name and not name.startswith('$') and 
-                    not name.startswith('#') and 
-                    not name.startswith('%') and
-                    not name.startswith('[')):
-                    players.append(name)
-            
-            return sorted(players)
+            return sorted(names)
             
         except Exception as e:
             logger.error(f"获取玩家列表时出错: {e}")
@@ -161,8 +224,7 @@ class DataManager:
             if not self.player_scores_json_path.exists():
                 return None
             
-            with open(self.player_scores_json_path, 'r', encoding='utf-8') as f:
-                player_data = json.load(f)
+            player_data = self._load_grouped()
             
             return player_data.get(player_name)
             
@@ -200,7 +262,7 @@ class ImageGenerator:
             
             # 保存图片到输出目录
             output_path = self.data_manager.output_dir / f"{player_name}_stats.png"
-            image.save(output_path)
+            image.save(output_path, format="PNG", **PNG_SAVE_OPTIONS["fast"])
             
             logger.info(f"战绩图已保存: {output_path}")
             return output_path, None
@@ -215,19 +277,39 @@ class RankingsManager:
     
     def __init__(self, data_manager: DataManager):
         self.data_manager = data_manager
+        
+        # 最近一次生成排行榜所用 player_scores_grouped.json 的修改时间
+        self._source_mtime: Optional[float] = None
+        # 最近一次直接从 rankings.json 读取的排行榜（无需重复保存）
+        self._loaded_rankings: Optional[Dict[str, Any]] = None
     
     def generate_rankings(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
-        """生成排行榜数据"""
+        """生成排行榜数据（player_scores_grouped.json 未变化时直接复用 rankings.json）"""
         try:
             if not API_AVAILABLE:
                 return None, "API 模块不可用，无法生成排行榜"
             
-            # 确保数据文件是最新的
-            if not self.data_manager.update_data_files():
+            # 确保数据文件是最新的（结果会写入 rankings.json，不沿用短时间内的检查结果）
+            if not self.data_manager.update_data_files(force=True):
                 return None, "数据文件更新失败"
             
-            # 使用 API 模块生成排行榜
-            return generate_rankings(self.data_manager.player_scores_json_path)
+            json_st = _stat_or_none(self.data_manager.player_scores_json_path)
+            self._source_mtime = None
+            self._loaded_rankings = None
+            
+            if json_st is None:
+                return None, "玩家数据文件不存在，请先运行数据更新"
+            
+            # 分组数据自上次生成后未修改，直接返回保存的排行榜
+            saved = load_rankings_from_json(self.data_manager.rankings_json_path)
+            if saved and saved.get("source_mtime") == json_st.st_mtime:
+                self._loaded_rankings = saved["rankings"]
+                return self._loaded_rankings, None
+            
+            # 使用 API 模块生成排行榜（复用 DataManager 缓存并已过滤的数据），
+            # 修改时间取自同一份缓存，保证与排行榜所用数据一致
+            self._source_mtime, names, entries = self.data_manager.get_valid_players()
+            return generate_rankings(zip(names, entries), filter_special=False)
             
         except Exception as e:
             logger.error(f"生成排行榜时出错: {e}")
@@ -239,7 +321,15 @@ class RankingsManager:
             if not API_AVAILABLE:
                 return False, "API 模块不可用，无法保存排行榜"
             
-            return save_rankings_to_json(rankings, self.data_manager.rankings_json_path)
+            # 排行榜本身就是从 rankings.json 读取的，无需重复写入
+            if rankings is self._loaded_rankings:
+                return True, None
+            
+            return save_rankings_to_json(
+                rankings,
+                self.data_manager.rankings_json_path,
+                self._source_mtime
+            )
             
         except Exception as e:
             logger.error(f"保存排行榜数据时出错: {e}")